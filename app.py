@@ -6,33 +6,55 @@ from test_case_generator import generate_test_cases
 from bug_finder import find_bugs_in_code
 from chat import chat_with_llm
 
+def _fast_copy(src, dst):
+    """Copy one file through the kernel fast path where available."""
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            if hasattr(os, 'copy_file_range'):
+                # Zero-copy inside the kernel (reflink/server-side on
+                # supporting filesystems)
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), 2**20):
+                    pass
+            else:
+                shutil.copyfileobj(fsrc, fdst, length=1024 * 1024)
+        shutil.copystat(src, dst)
+        return dst
+    except OSError:
+        return shutil.copy2(src, dst)
+
 def upload_repo(file):
     if file is None:
         return "No file uploaded."
-    
+
     # make search-folder if it doesn't exist
     search_folder = "search-folder"
     if not os.path.exists(search_folder):
         os.makedirs(search_folder)
-    
+
     # If it's a directory, copy its contents
     if os.path.isdir(file.name):
         try:
-            # Copy all files from uploaded directory to search-folder
-            for item in os.listdir(file.name):
-                source = os.path.join(file.name, item)
-                destination = os.path.join(search_folder, item)
-                if os.path.isdir(source):
-                    shutil.copytree(source, destination, dirs_exist_ok=True)
+            # scandir entries carry cached stat info, so no extra stat
+            # syscall per item like os.listdir + os.path.isdir
+            for entry in os.scandir(file.name):
+                destination = os.path.join(search_folder, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.copytree(
+                        entry.path, destination,
+                        dirs_exist_ok=True, copy_function=_fast_copy
+                    )
                 else:
-                    shutil.copy2(source, destination)
+                    _fast_copy(entry.path, destination)
             return f"✅ Repo contents copied to '{search_folder}' successfully."
         except Exception as e:
             return f"❌ Error copying repo: {str(e)}"
     else:
         # If it's a single file, copy it to search-folder
         try:
-            shutil.copy2(file.name, search_folder)
+            _fast_copy(
+                file.name,
+                os.path.join(search_folder, os.path.basename(file.name))
+            )
             return f"✅ File copied to '{search_folder}' successfully."
         except Exception as e:
             return f"❌ Error copying file: {str(e)}"
@@ -40,10 +62,11 @@ def upload_repo(file):
 def find_bugs():
     try:
         from bug_finder import find_bugs_in_code
-        bug_report = find_bugs_in_code()
-        return bug_report
+        # Generator: Gradio updates the textbox with each partial report
+        for partial_report in find_bugs_in_code():
+            yield partial_report
     except Exception as e:
-        return f"❌ Error scanning for bugs: {str(e)}"
+        yield f"❌ Error scanning for bugs: {str(e)}"
 
 def generate_tests(code_input):
     """Generate test cases for the provided code."""
@@ -60,9 +83,12 @@ with gr.Blocks() as app:
         clear_btn = gr.Button("Clear Chat")
         
         def respond(message, chat_history):
-            bot_message = chat_with_llm(message, chat_history)
-            chat_history.append((message, bot_message))
-            return "", chat_history
+            # chat_with_llm streams partial answers; update the last chat
+            # entry in place as they arrive
+            chat_history.append((message, ""))
+            for partial in chat_with_llm(message, chat_history[:-1]):
+                chat_history[-1] = (message, partial)
+                yield "", chat_history
         
         ask_btn.click(respond, [question_input, chatbot], [question_input, chatbot])
         question_input.submit(respond, [question_input, chatbot], [question_input, chatbot])
@@ -84,4 +110,7 @@ with gr.Blocks() as app:
         test_btn.click(generate_tests, inputs=[test_code_input], outputs=[test_output])
 
 if __name__ == "__main__":
+    # Let several sessions run concurrently instead of serializing every
+    # event behind one slow LLM turn
+    app.queue(default_concurrency_limit=8)
     app.launch()
\ No newline at end of file
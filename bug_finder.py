@@ -1,119 +1,483 @@
+import ast
+import autopep8
+import bisect
+import hashlib
+import json
 import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 from typing import Optional
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_ollama import ChatOllama
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
 from openai import OpenAI
+from rag_core import build_store
 
 
-def initialize_vector_store():
-    """Initialize the vector store with documents from search-folder."""
-    try:
-        if not os.path.exists("search-folder"):
-            print("search-folder does not exist")
-            return None
-            
-        loader = DirectoryLoader(
-            "search-folder", 
-            glob="**/*", 
-            loader_cls=TextLoader, 
-            loader_kwargs={'encoding': 'utf-8'},
-            show_progress=True,
-            use_multithreading=True
-        )
-        documents = loader.load()
-        
-        if not documents:
-            print("No documents found in search-folder")
-            return None
-
-        print(f"Loaded {len(documents)} documents")
-        
-        # Add document IDs
-        for i, doc in enumerate(documents):
-            doc.metadata["doc_id"] = i
-            
-        # Split documents into chunks
-        text_splitter = CharacterTextSplitter(
-            chunk_size=1500,
-            chunk_overlap=280
-        )
-        chunks = text_splitter.split_documents(documents)
-        print(f"Split into {len(chunks)} chunks")
+# Builtin names that user code commonly shadows by accident
+_BUILTINS = frozenset({
+    'abs', 'all', 'any', 'ascii', 'bin', 'bool', 'bytearray', 'bytes',
+    'callable', 'chr', 'classmethod', 'compile', 'complex', 'delattr', 'dict',
+    'dir', 'divmod', 'enumerate', 'eval', 'exec', 'filter', 'float', 'format',
+    'frozenset', 'getattr', 'globals', 'hasattr', 'hash', 'help', 'hex', 'id',
+    'input', 'int', 'isinstance', 'issubclass', 'iter', 'len', 'list',
+    'locals', 'map', 'max', 'memoryview', 'min', 'next', 'object', 'oct',
+    'open', 'ord', 'pow', 'print', 'property', 'range', 'repr', 'reversed',
+    'round', 'set', 'setattr', 'slice', 'sorted', 'staticmethod', 'str',
+    'sum', 'super', 'tuple', 'type', 'vars', 'zip'
+})
 
-        # Create embeddings and vectorstore
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
-        return FAISS.from_documents(chunks, embedding=embeddings)
-        
-    except Exception as e:
-        print(f"Error initializing vector store: {str(e)}")
-        return None
+# Patterns are compiled once at import time so every scanned file reuses the
+# same compiled regex instead of rebuilding it per file
+_DANGEROUS_DEFAULT_RE = re.compile(r'def\s+\w+\s*\(.*=\s*(\[.*\]|\{.*\}).*\)')
+_BROAD_EXCEPT_RE = re.compile(r'except\s*:\s*$|except\s+Exception\s*:', re.MULTILINE)
+_BUILTINS_PATTERN_STR = '|'.join(map(re.escape, sorted(_BUILTINS)))
+_SHADOW_RES = tuple(re.compile(pattern) for pattern in (
+    r'\bdef\s+(' + _BUILTINS_PATTERN_STR + r')\s*\(',
+    r'\b(' + _BUILTINS_PATTERN_STR + r')\s*=[^=]',
+    r'\bfor\s+(' + _BUILTINS_PATTERN_STR + r')\s+in\b'
+))
+_MUTABLE_DEFAULT_PARAM_RE = re.compile(r'(\w+)\s*=\s*(\[\]|\{\})')
+
+# Vendor and generated code is never worth scanning, and oversized files
+# (usually generated) would dominate scan time
+_MAX_SCAN_FILE_SIZE = 500_000
+_SKIP_DIRS = {'.venv', 'venv', 'site-packages', 'migrations', '__pycache__',
+              'node_modules', '.git'}
+_SKIP_SUFFIXES = ('_pb2.py', '_pb2_grpc.py')
+# Scan cache, deliberately outside search-folder: everything in there is
+# user-supplied upload content, so the app must neither trust files it
+# finds there nor add its own (which would churn the store fingerprint)
+_BUG_CACHE_DB = os.path.join("vector_db", "bugcache.db")
+
+
+class Bug:
+    """A single issue found by the static scanner."""
+
+    def __init__(self, file_path, line_num, bug_type, description):
+        self.file_path = file_path
+        self.line_num = line_num
+        self.bug_type = bug_type
+        self.description = description
+
+    def __str__(self):
+        return f"{self.file_path}:{self.line_num} [{self.bug_type}] {self.description}"
+
+
+_TERMINATORS = (ast.Return, ast.Raise, ast.Break, ast.Continue)
+
+
+class _BugVisitor(ast.NodeVisitor):
+    """Collects every AST-detectable bug for one file in a single traversal."""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.bugs = []
+
+    def _add(self, lineno, bug_type, description):
+        self.bugs.append(Bug(self.file_path, lineno, bug_type, description))
+
+    def _visit_function(self, node):
+        if node.name in _BUILTINS:
+            self._add(node.lineno, "ShadowedBuiltin",
+                      f"'{node.name}' shadows a Python builtin")
+        defaults = node.args.defaults + [d for d in node.args.kw_defaults if d]
+        for default in defaults:
+            if isinstance(default, (ast.List, ast.Dict, ast.Set)):
+                self._add(node.lineno, "DangerousDefault",
+                          "Mutable default argument is shared across calls")
+        self.generic_visit(node)
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+
+    def visit_ExceptHandler(self, node):
+        if node.type is None or (
+            isinstance(node.type, ast.Name) and node.type.id == 'Exception'
+        ):
+            self._add(node.lineno, "BroadException",
+                      "Except clause is too broad and may hide errors")
+        self.generic_visit(node)
 
+    def visit_Assign(self, node):
+        for target in node.targets:
+            for name in ast.walk(target):
+                if isinstance(name, ast.Name) and name.id in _BUILTINS:
+                    self._add(name.lineno, "ShadowedBuiltin",
+                              f"'{name.id}' shadows a Python builtin")
+        self.generic_visit(node)
 
-def initialize_conversation_chain(vectorstore):
-    """Initialize the conversation chain with the given vectorstore."""
+    def visit_For(self, node):
+        for name in ast.walk(node.target):
+            if isinstance(name, ast.Name) and name.id in _BUILTINS:
+                self._add(name.lineno, "ShadowedBuiltin",
+                          f"'{name.id}' shadows a Python builtin")
+        self.generic_visit(node)
+
+    def generic_visit(self, node):
+        for field in ('body', 'orelse', 'finalbody'):
+            block = getattr(node, field, None)
+            if isinstance(block, list):
+                for stmt, following in zip(block, block[1:]):
+                    if isinstance(stmt, _TERMINATORS):
+                        self._add(following.lineno, "UnreachableCode",
+                                  "Statement is unreachable")
+                        break
+        super().generic_visit(node)
+
+
+def _scan_one_file(path_str, content):
+    """Analyze one file's content; runs in a pool worker process.
+
+    Top-level rather than a BugFinder method so the executor can pickle
+    it, and returns plain dicts rather than Bug objects for the same
+    reason.
+    """
+    return [vars(bug) for bug in _analyze_file(path_str, content)]
+
+
+def _analyze_file(file_path, content):
+    """Run every check on one file and return the bugs found."""
     try:
-        if vectorstore is None:
-            return None
-            
-        llm = ChatOllama(
-            model="gemma3:4b",
-            temperature=0.7
-        )
-        memory = ConversationBufferMemory(
-            memory_key='chat_history', 
-            return_messages=True
-        )
-        retriever = vectorstore.as_retriever()
-        
-        conversation_chain = ConversationalRetrievalChain.from_llm(
-            llm=llm,
-            retriever=retriever,
-            memory=memory
+        tree = ast.parse(content)
+    except SyntaxError:
+        # File does not parse; fall back to the regex checks. Line numbers
+        # come from one prebuilt line-start array instead of rescanning the
+        # content prefix for every match.
+        line_starts = [0] + [m.end() for m in re.finditer(r'\n', content)]
+        return (_check_dangerous_defaults(file_path, content, line_starts)
+                + _check_broad_exceptions(file_path, content, line_starts)
+                + _check_shadowing_builtins(file_path, content, line_starts))
+
+    visitor = _BugVisitor(str(file_path))
+    visitor.visit(tree)
+    return visitor.bugs + _check_unused_imports(file_path, tree)
+
+
+def _check_unused_imports(file_path, tree):
+    """Flag imported names that are never referenced in the file."""
+    bugs = []
+    imports = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                name = alias.asname or alias.name.split('.')[0]
+                imports[name] = node.lineno
+        elif isinstance(node, ast.ImportFrom):
+            for alias in node.names:
+                if alias.name == '*':
+                    continue
+                name = alias.asname or alias.name
+                imports[name] = node.lineno
+
+    used = {
+        node.id for node in ast.walk(tree)
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)
+    }
+    for name, lineno in imports.items():
+        if name not in used:
+            bugs.append(Bug(
+                str(file_path), lineno, "UnusedImport",
+                f"'{name}' is imported but never used"
+            ))
+    return bugs
+
+
+def _check_dangerous_defaults(file_path, content, line_starts):
+    """Flag mutable default arguments (lists/dicts)."""
+    bugs = []
+    for match in _DANGEROUS_DEFAULT_RE.finditer(content):
+        line_num = bisect.bisect_right(line_starts, match.start())
+        bugs.append(Bug(
+            str(file_path), line_num, "DangerousDefault",
+            "Mutable default argument is shared across calls"
+        ))
+    return bugs
+
+
+def _check_broad_exceptions(file_path, content, line_starts):
+    """Flag bare or overly broad except clauses."""
+    bugs = []
+    for match in _BROAD_EXCEPT_RE.finditer(content):
+        line_num = bisect.bisect_right(line_starts, match.start())
+        bugs.append(Bug(
+            str(file_path), line_num, "BroadException",
+            "Except clause is too broad and may hide errors"
+        ))
+    return bugs
+
+
+def _check_shadowing_builtins(file_path, content, line_starts):
+    """Flag names that shadow Python builtins."""
+    bugs = []
+    for regex in _SHADOW_RES:
+        for match in regex.finditer(content):
+            line_num = bisect.bisect_right(line_starts, match.start())
+            bugs.append(Bug(
+                str(file_path), line_num, "ShadowedBuiltin",
+                f"'{match.group(1)}' shadows a Python builtin"
+            ))
+    return bugs
+
+
+class BugFinder:
+    """Static scanner that flags common Python bugs in the search folder."""
+
+    def __init__(self, search_folder="search-folder"):
+        self.search_folder = Path(search_folder)
+        self.bugs = []
+
+    def scan_for_bugs(self):
+        """Scan every Python file under the search folder for common bugs."""
+        self.bugs = []
+        if not self.search_folder.exists():
+            print(f"{self.search_folder} does not exist")
+            return self.bugs
+
+        # Content-addressed cache: unchanged files skip analysis entirely
+        os.makedirs(os.path.dirname(_BUG_CACHE_DB), exist_ok=True)
+        cache = sqlite3.connect(_BUG_CACHE_DB)
+        cache.execute(
+            "CREATE TABLE IF NOT EXISTS bugs(hash TEXT PRIMARY KEY, payload TEXT)"
         )
-        return conversation_chain
-    except Exception as e:
-        print(f"Error initializing conversation chain: {str(e)}")
-        return None
-
-
-# Initialize vector store
-vectorstore = initialize_vector_store()
-
-# Initialize conversation chain
-conversation_chain = initialize_conversation_chain(vectorstore)
-
-
-def find_bugs_in_code():
-    """Find bugs in the codebase by querying the LLM with a specific prompt."""
-    # Re-initialize if needed
-    global conversation_chain, vectorstore
-    
-    if conversation_chain is None:
-        # Try to re-initialize vector store and conversation chain
-        vectorstore = initialize_vector_store()
-        conversation_chain = initialize_conversation_chain(vectorstore)
-        
-        if conversation_chain is None:
-            return "Error: Conversation chain not initialized. Please check the setup and ensure Ollama is running with the required model."
-    
-    # Specific prompt for bug finding
+
+        # (path, hash, content) tuples for files the cache cannot answer
+        pending = []
+        for file_path in self.search_folder.rglob("*.py"):
+            if any(part in _SKIP_DIRS for part in file_path.parts):
+                continue
+            if file_path.name.endswith(_SKIP_SUFFIXES):
+                continue
+            try:
+                if file_path.stat().st_size > _MAX_SCAN_FILE_SIZE:
+                    continue
+            except OSError:
+                continue
+            try:
+                # One bulk read and one C-level decode, instead of the
+                # incremental text-mode decoder and newline translation
+                content = file_path.read_bytes().decode('utf-8', errors='replace')
+            except OSError as e:
+                print(f"Error reading {file_path}: {str(e)}")
+                continue
+
+            file_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+            row = cache.execute(
+                "SELECT payload FROM bugs WHERE hash=?", (file_hash,)
+            ).fetchone()
+            if row is not None:
+                self.bugs.extend(
+                    Bug(**{**fields, 'file_path': str(file_path)})
+                    for fields in json.loads(row[0])
+                )
+            else:
+                pending.append((str(file_path), file_hash, content))
+
+        # Analysis is pure per-file CPU work, so spread cache misses
+        # across worker processes instead of parsing them one by one
+        if pending:
+            with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+                results = executor.map(
+                    _scan_one_file,
+                    [path for path, _, _ in pending],
+                    [content for _, _, content in pending],
+                    chunksize=8
+                )
+                for (path, file_hash, _), bug_dicts in zip(pending, results):
+                    cache.execute(
+                        "INSERT OR REPLACE INTO bugs VALUES (?, ?)",
+                        (file_hash, json.dumps(bug_dicts))
+                    )
+                    self.bugs.extend(Bug(**fields) for fields in bug_dicts)
+
+        cache.commit()
+        cache.close()
+        return self.bugs
+
+    def fix_bugs(self):
+        """Apply automatic fixes for fixable bugs; one write per file."""
+        by_file = {}
+        for bug in self.bugs:
+            by_file.setdefault(bug.file_path, []).append(bug)
+
+        fixed_files = []
+        for file_path, file_bugs in by_file.items():
+            try:
+                # Strict decode here: this path writes the text back, and
+                # persisting U+FFFD replacement characters would corrupt
+                # non-UTF-8 files. Lenient decoding is for scanning only
+                content = Path(file_path).read_bytes().decode('utf-8')
+            except UnicodeDecodeError:
+                continue
+            except OSError as e:
+                print(f"Error reading {file_path}: {str(e)}")
+                continue
+
+            fixed_content = self._apply_fixes_to_content(content, file_bugs)
+            # Format in the same pass so each file is read and written once
+            final = autopep8.fix_code(fixed_content, options={'aggressive': 2})
+            if final == content:
+                continue
+
+            try:
+                # Write to a sibling temp file and os.replace it into
+                # place: an atomic rename, never a half-written file
+                tmp_path = file_path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(final)
+                os.replace(tmp_path, file_path)
+                fixed_files.append(file_path)
+            except OSError as e:
+                print(f"Error writing {file_path}: {str(e)}")
+        return fixed_files
+
+    def _apply_fixes_to_content(self, content, bugs):
+        """Rewrite fixable bugs (mutable defaults) in one file's content."""
+        lines = content.split('\n')
+        pending_inserts = []
+        for bug in bugs:
+            if bug.bug_type != "DangerousDefault":
+                continue
+            line_idx = bug.line_num - 1
+            if line_idx >= len(lines):
+                continue
+
+            # The guard must land inside the function body, so only fix
+            # defs whose body is an indented block on the next line. A
+            # one-liner (body after the colon) or a signature spanning
+            # lines would get the guard at the wrong level and break the
+            # file; those stay report-only
+            if not lines[line_idx].rstrip().endswith(':'):
+                continue
+            if line_idx + 1 >= len(lines):
+                continue
+            def_indent = re.match(r'(\s*)', lines[line_idx]).group(1)
+            indent = re.match(r'(\s*)', lines[line_idx + 1]).group(1)
+            if len(indent) <= len(def_indent):
+                continue
+
+            # One substitution pass captures the parameter as it rewrites
+            captured = []
+
+            def _repl(match):
+                captured.append((match.group(1), match.group(2)))
+                return f"{match.group(1)}=None"
+
+            new_line, replaced = _MUTABLE_DEFAULT_PARAM_RE.subn(
+                _repl, lines[line_idx], count=1
+            )
+            if not replaced:
+                continue
+            lines[line_idx] = new_line
+
+            param_name, default = captured[0]
+            pending_inserts.append((line_idx + 1, [
+                f"{indent}if {param_name} is None:",
+                f"{indent}    {param_name} = {default}",
+            ]))
+
+        # Apply inserts last, descending, so line indexes never shift
+        # while the bugs are being processed
+        for insert_at, new_lines in sorted(pending_inserts, reverse=True):
+            lines[insert_at:insert_at] = new_lines
+        return '\n'.join(lines)
+
+
+def scan_and_fix_bugs(search_folder="search-folder"):
+    """Scan for bugs, reformat the scanned files, and return a report."""
+    bug_finder = BugFinder(search_folder)
+    bugs = bug_finder.scan_for_bugs()
+    # fix_bugs formats as part of the same write, so no second pass over
+    # the tree is needed
+    fixed_files = bug_finder.fix_bugs()
+
+    if not bugs:
+        return "No bugs found. All OK."
+    report = [f"Found {len(bugs)} potential bugs:"]
+    report.extend(str(bug) for bug in bugs)
+    if fixed_files:
+        report.append(f"Applied fixes and formatting to {len(fixed_files)} files")
+    return "\n".join(report)
+
+
+# Q4_K_M quantization roughly halves memory traffic during decoding
+# with near-identical output quality
+_CHAT_MODEL = "gemma3:4b-it-q4_K_M"
+
+_ollama_client = OpenAI(base_url='http://localhost:11434/v1', api_key='ollama')
+
+
+# The vector store is expensive to build (model load plus a full
+# embedding pass), so the retriever is created lazily on first use
+# instead of at import time; a None store is not cached, so the next
+# scan retries after e.g. a repo upload
+_retriever_lock = threading.Lock()
+_retriever = None
+
+
+def _get_retriever():
+    """Build the code retriever on first use; thread-safe."""
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                vectorstore = build_store()
+                if vectorstore is None:
+                    return None
+                _retriever = vectorstore.as_retriever(
+                    search_type="mmr",
+                    search_kwargs={"k": 4, "fetch_k": 20, "lambda_mult": 0.5}
+                )
+    return _retriever
+
+
+def find_bugs_in_code(deep=True):
+    """Find bugs in the codebase, yielding the answer as it streams in."""
+    # The static scan is cheap; when it already answers definitively
+    # there is no reason to pay for a multi-second LLM inference
+    static_report = scan_and_fix_bugs("search-folder")
+    yield static_report
+    if "No bugs found" in static_report or not deep:
+        return
+
+    retriever = _get_retriever()
+    if retriever is None:
+        yield static_report + "\n\nError: Vector store not initialized. Please check the setup and ensure Ollama is running with the required model."
+        return
+
+    # Hand the static findings to the LLM so it reviews rather than
+    # rediscovers them
     bug_prompt = (
-        "Analyze all the code in the provided codebase and identify any bugs, "
-        "errors, or potential issues. Focus only on actual bugs and problems. "
-        "If you find any bugs, list them clearly. If there are no bugs or nothing "
-        "is wrong in the code, simply respond with 'All OK'. Do not make up bugs "
-        "that don't exist."
+        "A static scan of the codebase found these issues:\n"
+        f"{static_report}\n\n"
+        "Give a semantic review of the code: confirm which of these are "
+        "real problems and point out any deeper bugs the static scan "
+        "cannot see. Do not make up bugs that don't exist."
     )
-    
+
     try:
-        result = conversation_chain.invoke({"question": bug_prompt})
-        return result["answer"]
+        # Stream the completion directly, as chat_with_llm does; the
+        # legacy chain's stream() just wrapped invoke and delivered the
+        # whole answer as one chunk
+        docs = retriever.invoke(bug_prompt)
+        context = "\n\n".join(doc.page_content for doc in docs)
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    "You review code for bugs. "
+                    "Use this context from the repository:\n" + context
+                )
+            },
+            {"role": "user", "content": bug_prompt},
+        ]
+        partial = static_report + "\n\n--- Semantic review ---\n"
+        stream = _ollama_client.chat.completions.create(
+            model=_CHAT_MODEL, messages=messages, stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                partial += chunk.choices[0].delta.content
+                yield partial
     except Exception as e:
-        return f"Error: {str(e)}"
+        yield f"Error: {str(e)}"
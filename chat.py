@@ -1,102 +1,76 @@
-import os
-import glob
 from openai import OpenAI
 import gradio as gr
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_ollama import ChatOllama
+from rag_core import build_store
 
 
 # Constants
 OLLAMA_API = "http://localhost:11434/api/chat"
 HEADERS = {"Content-Type": "application/json"}
-MODEL = "gemma3:4b"
+# Q4_K_M keeps the embedding/output projections at higher precision, so
+# quality is close to the full model at roughly half the memory traffic
+MODEL = "gemma3:4b-it-q4_K_M"
 
 # Initialize OpenAI client for Ollama
 openai_client = OpenAI(base_url='http://localhost:11434/v1', api_key='ollama')
 
-def initialize_vector_store():
-    """Initialize the vector store with documents from search-folder."""
-    try:
-        
-        if not os.path.exists("search-folder"):
-            print("search-folder does not exist")
-            return None
-            
-        
-        loader = DirectoryLoader(
-            "search-folder", 
-            glob="**/*", 
-            loader_cls=TextLoader, 
-            loader_kwargs={'encoding': 'utf-8'},
-            show_progress=True,
-            use_multithreading=True
-        )
-        documents = loader.load()
-        
-        
-        for i, doc in enumerate(documents):
-            doc.metadata["doc_id"] = i
-            
-        if not documents:
-            print("No documents found in search-folder")
-            return None
-
-        print(f"Loaded {len(documents)} documents")
-        
-        # Split documents into chunks
-        text_splitter = CharacterTextSplitter(chunk_size=1500, chunk_overlap=280)
-        chunks = text_splitter.split_documents(documents)
-        
-        print(f"Split into {len(chunks)} chunks")
-
-        # Create embeddings
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
-
-        # Create vectorstore
-        vectorstore = FAISS.from_documents(chunks, embedding=embeddings)
-        return vectorstore
-    except Exception as e:
-        print(f"Error initializing vector store: {str(e)}")
-        return None
 
+# Built on first successful use; a None (store not ready yet) is not
+# cached, so the next turn retries after e.g. a repo upload
+_retriever = None
 
-
-
-
-vectorstore = initialize_vector_store()
-
-# chat if convo chain is successful
-conversation_chain = None
-if vectorstore:
-    try:
-        llm = ChatOllama(model="gemma3:4b", temperature=0.7)
-        memory = ConversationBufferMemory(memory_key='chat_history', return_messages=True)
-        retriever = vectorstore.as_retriever()
-        conversation_chain = ConversationalRetrievalChain.from_llm(
-            llm=llm, 
-            retriever=retriever, 
-            memory=memory
+def get_retriever():
+    """Build the retriever on first use, not at import time."""
+    global _retriever
+    if _retriever is None:
+        vectorstore = build_store()
+        if vectorstore is None:
+            return None
+        # MMR drops near-duplicate chunks from the 20 candidates, so the
+        # 4 kept chunks carry distinct content and the prompt stays small
+        _retriever = vectorstore.as_retriever(
+            search_type="mmr",
+            search_kwargs={"k": 4, "fetch_k": 20, "lambda_mult": 0.5}
         )
-    except Exception as e:
-        print(f"Error initializing conversation chain: {str(e)}")
+    return _retriever
 
 def chat_with_llm(message, history):
+    """Stream the answer so the first token, not the last, sets latency.
 
+    Retrieves with the raw question and answers in a single generation;
+    ConversationalRetrievalChain spent an extra LLM call per turn just
+    condensing the question before retrieving.
+    """
+    retriever = get_retriever()
+    if retriever is None:
+        yield "Error: vector store not initialized. Please check the setup."
+        return
 
-
-    if conversation_chain is None:
-        return "Error: Conversation chain not initialized. Please check the setup."
-    
     try:
-        result = conversation_chain.invoke({"question": message})
-        return result["answer"]
+        docs = retriever.invoke(message)
+        context = "\n\n".join(doc.page_content for doc in docs)
+        messages = [{
+            "role": "system",
+            "content": (
+                "You answer questions about a codebase. "
+                "Use this context from the repository:\n" + context
+            )
+        }]
+        # Same six-turn window the chain memory used, as plain messages
+        for user_msg, bot_msg in history[-6:]:
+            messages.append({"role": "user", "content": user_msg})
+            if bot_msg:
+                messages.append({"role": "assistant", "content": bot_msg})
+        messages.append({"role": "user", "content": message})
+
+        answer = ""
+        stream = openai_client.chat.completions.create(
+            model=MODEL, messages=messages, stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                answer += chunk.choices[0].delta.content
+                yield answer
+        if not answer:
+            yield "Error: no answer generated."
     except Exception as e:
-        return f"Error: {str(e)}"
\ No newline at end of file
+        yield f"Error: {str(e)}"
@@ -0,0 +1,349 @@
+import os
+import glob
+import hashlib
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+# Pin thread counts before torch/faiss/numpy load their OpenMP and BLAS
+# runtimes; left alone, each spawns its own cpu_count() pool and they
+# oversubscribe the cores
+_NUM_THREADS = os.cpu_count() or 1
+os.environ.setdefault("OMP_NUM_THREADS", str(_NUM_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(_NUM_THREADS))
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+import faiss
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain.schema import Document
+from langchain_huggingface import HuggingFaceEmbeddings
+
+
+# Constants
+VECTOR_DB_DIR = "vector_db"
+# Per-chunk vector cache, kept next to the saved indexes; it survives
+# the stale-index pruning because that only removes directories
+EMBEDDING_CACHE = "embedding-cache.npz"
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_MODEL_DIR = "onnx-minilm-int8"
+# Only these are worth embedding; anything else is binary or too big to
+# be a useful context source
+TEXT_EXTENSIONS = (
+    ".py", ".js", ".ts", ".tsx", ".jsx", ".md", ".txt", ".rst", ".json",
+    ".yaml", ".yml", ".java", ".go", ".rs", ".c", ".h", ".cpp", ".hpp",
+    ".cs", ".rb"
+)
+MAX_FILE_SIZE = 2_000_000
+
+# Let FAISS use every core for distance kernels, and flag wheels built
+# without SIMD support since those are several times slower per query
+faiss.omp_set_num_threads(_NUM_THREADS)
+try:
+    if not any(flag in faiss.get_compile_options() for flag in ("AVX2", "AVX512")):
+        print("Warning: faiss built without AVX2/AVX-512; retrieval will be slower")
+except Exception:
+    pass
+
+class OnnxEmbeddings:
+    """MiniLM embeddings on an INT8-quantized ONNX Runtime session.
+
+    Exposes the embed_documents/embed_query interface LangChain expects,
+    so it drops in wherever HuggingFaceEmbeddings was used. Dynamic INT8
+    roughly halves CPU latency and memory versus FP32 Torch.
+    """
+
+    def __init__(self):
+        import numpy as np
+        from transformers import AutoTokenizer
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+        if not os.path.isdir(ONNX_MODEL_DIR):
+            # Export and quantize once; later runs load the saved model
+            model = ORTModelForFeatureExtraction.from_pretrained(
+                EMBEDDING_MODEL, export=True
+            )
+            model.save_pretrained(ONNX_MODEL_DIR)
+            quantizer = ORTQuantizer.from_pretrained(ONNX_MODEL_DIR)
+            quantizer.quantize(
+                save_dir=ONNX_MODEL_DIR,
+                quantization_config=AutoQuantizationConfig.avx512_vnni(
+                    is_static=False, per_channel=False
+                )
+            )
+        self._np = np
+        self.tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            ONNX_MODEL_DIR, file_name="model_quantized.onnx"
+        )
+
+    def _encode(self, texts):
+        np = self._np
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True,
+            max_length=256, return_tensors="np"
+        )
+        hidden = self.model(**encoded).last_hidden_state
+        # Mean-pool over real tokens, then L2-normalize
+        mask = encoded["attention_mask"][..., None].astype(hidden.dtype)
+        pooled = (hidden * mask).sum(axis=1) / mask.sum(axis=1)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.maximum(norms, 1e-12)
+
+    def embed_documents(self, texts):
+        vectors = []
+        for start in range(0, len(texts), 64):
+            vectors.extend(self._encode(texts[start:start + 64]).tolist())
+        return vectors
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
+
+def _cache_query_embeddings(embeddings):
+    """Memoize embed_query so repeated questions skip the forward pass."""
+    cache = {}
+    original = embeddings.embed_query
+
+    def cached(text):
+        vector = cache.get(text)
+        if vector is None:
+            vector = original(text)
+            if len(cache) >= 1024:
+                cache.clear()
+            cache[text] = vector
+        return vector
+
+    try:
+        embeddings.embed_query = cached
+    except Exception:
+        # Some embedding classes reject attribute patching; caching is
+        # an optimization, not a requirement
+        pass
+    return embeddings
+
+# Memoized by hand rather than lru_cache so a failed load (e.g. a
+# first-run model download that errors) is retried on the next call
+# instead of being cached for the life of the process
+_embeddings = None
+
+def get_embeddings():
+    """INT8 ONNX MiniLM when optimum is installed, Torch fallback otherwise.
+
+    The loaded model is shared by every caller in the process.
+    """
+    global _embeddings
+    if _embeddings is not None:
+        return _embeddings
+    try:
+        embeddings = _cache_query_embeddings(OnnxEmbeddings())
+    except Exception as e:
+        print(f"ONNX embeddings unavailable ({str(e)}), falling back to Torch")
+        import torch
+        torch.set_num_threads(_NUM_THREADS)
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        embeddings = HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL,
+            model_kwargs={"device": device},
+            encode_kwargs={
+                "batch_size": 256 if device == "cuda" else 32,
+                "normalize_embeddings": True
+            }
+        )
+        if device == "cuda":
+            # FP16 halves VRAM and runs the GEMMs on tensor cores; MiniLM
+            # loses nothing measurable at half precision
+            embeddings.client = embeddings.client.half()
+        embeddings = _cache_query_embeddings(embeddings)
+    _embeddings = embeddings
+    return _embeddings
+
+def _encode_texts(embeddings, texts):
+    """Batch-encode texts, shortest first to minimize padding waste."""
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    encoded = embeddings.embed_documents([texts[i] for i in order])
+    vectors = [None] * len(texts)
+    for position, vector in zip(order, encoded):
+        vectors[position] = vector
+    return vectors
+
+def _load_one(path):
+    """Load one file as a Document; runs in a pool worker process."""
+    try:
+        with open(path, encoding='utf-8', errors='ignore') as f:
+            return Document(page_content=f.read(), metadata={"source": path})
+    except OSError:
+        return None
+
+def _store_cache_key(folder):
+    """Fingerprint of folder contents (paths plus mtimes)."""
+    entries = sorted(
+        f"{path}:{os.path.getmtime(path)}"
+        for path in glob.glob(os.path.join(folder, "**/*"), recursive=True)
+        if os.path.isfile(path)
+    )
+    return hashlib.sha1("".join(entries).encode('utf-8')).hexdigest()
+
+# Successful stores per argument set; None results are deliberately not
+# stored, so a missing search-folder or a transient failure is retried
+# on the next call (e.g. after the user uploads a repo)
+_stores = {}
+
+def build_store(folder="search-folder", extensions=TEXT_EXTENSIONS,
+                max_file_size=MAX_FILE_SIZE, chunk_size=256,
+                chunk_overlap=32, cache_root=VECTOR_DB_DIR):
+    """Build (or load) the FAISS store over a folder of text files.
+
+    Successful builds are memoized per argument set, so every module
+    that needs the store pays for the embedding pass at most once per
+    process; failures return None and are retried on the next call.
+    """
+    key = (folder, extensions, max_file_size, chunk_size, chunk_overlap,
+           cache_root)
+    store = _stores.get(key)
+    if store is None:
+        store = _build_store(folder, extensions, max_file_size,
+                             chunk_size, chunk_overlap, cache_root)
+        if store is not None:
+            _stores[key] = store
+    return store
+
+def _build_store(folder, extensions, max_file_size, chunk_size,
+                 chunk_overlap, cache_root):
+    """One uncached build; see build_store for the public entry point."""
+    try:
+
+        if not os.path.exists(folder):
+            print(f"{folder} does not exist")
+            return None
+
+        # Reuse the saved index when the folder contents are unchanged;
+        # rebuilding re-embeds every chunk and dominates startup time
+        embeddings = get_embeddings()
+        cache_dir = os.path.join(cache_root, _store_cache_key(folder))
+        if os.path.isdir(cache_dir):
+            print(f"Loading vector store from {cache_dir}")
+            # Same metric as the fresh-build path below; without it the
+            # reloaded store would score the IP index with L2 semantics
+            return FAISS.load_local(
+                cache_dir, embeddings, allow_dangerous_deserialization=True,
+                distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+            )
+
+        # Read and decode files across all cores; TextLoader in a single
+        # process leaves the other cores idle during the UTF-8 decode.
+        # Filtering by extension and size first skips images, archives
+        # and other binaries before any open/read happens
+        paths = [
+            path for path in glob.glob(os.path.join(folder, "**/*"), recursive=True)
+            if os.path.isfile(path)
+            and path.lower().endswith(extensions)
+            and os.path.getsize(path) < max_file_size
+        ]
+        documents = []
+        with ProcessPoolExecutor() as executor:
+            for document in executor.map(_load_one, paths, chunksize=32):
+                if document is not None:
+                    documents.append(document)
+
+        for i, doc in enumerate(documents):
+            doc.metadata["doc_id"] = i
+
+        if not documents:
+            print(f"No documents found in {folder}")
+            return None
+
+        print(f"Loaded {len(documents)} documents")
+
+        # Size chunks by MiniLM tokens so nothing the encoder sees is
+        # truncated, preferring code-structure boundaries so chunks stay
+        # aligned with classes and functions
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL)
+        text_splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+            tokenizer, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+            separators=["\n\nclass ", "\n\ndef ", "\n\n", "\n", " ", ""]
+        )
+        chunks = text_splitter.split_documents(documents)
+
+        print(f"Split into {len(chunks)} chunks")
+
+        # Embeddings are deterministic per (model, text), so key every
+        # chunk by content hash: duplicates (licenses, boilerplate,
+        # vendored copies) embed once within a build, and chunks that
+        # survived a folder edit are reused from the on-disk cache
+        # instead of being re-embedded on rebuild
+        texts = [chunk.page_content for chunk in chunks]
+        digests = [
+            hashlib.blake2b(
+                (EMBEDDING_MODEL + text).encode('utf-8'), digest_size=16
+            ).hexdigest()
+            for text in texts
+        ]
+
+        cache_path = os.path.join(cache_root, EMBEDDING_CACHE)
+        cached = {}
+        if os.path.exists(cache_path):
+            data = np.load(cache_path)
+            cached = dict(zip(data["hashes"], data["vectors"]))
+
+        missing_index = {}
+        missing_texts = []
+        for digest, text in zip(digests, texts):
+            if digest not in cached and digest not in missing_index:
+                missing_index[digest] = len(missing_texts)
+                missing_texts.append(text)
+        if missing_texts:
+            new_vectors = _encode_texts(embeddings, missing_texts)
+            for digest, position in missing_index.items():
+                cached[digest] = np.asarray(
+                    new_vectors[position], dtype=np.float32
+                )
+        print(f"Embedded {len(missing_texts)} chunks, "
+              f"reused {len(texts) - len(missing_texts)} from cache")
+
+        vectors = np.asarray([cached[d] for d in digests], dtype=np.float32)
+
+        # HNSW searches the graph in roughly O(log N) per query instead
+        # of the flat default's scan over every vector. Vectors are
+        # already L2-normalized, so inner product equals cosine and is
+        # cheaper per comparison than the L2 default
+        index = faiss.IndexHNSWFlat(
+            vectors.shape[1], 32, faiss.METRIC_INNER_PRODUCT
+        )
+        index.hnsw.efConstruction = 200
+        index.hnsw.efSearch = 64
+        index.add(vectors)
+        vectorstore = FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=InMemoryDocstore({
+                str(i): Document(
+                    page_content=chunk.page_content, metadata=chunk.metadata
+                )
+                for i, chunk in enumerate(chunks)
+            }),
+            index_to_docstore_id={i: str(i) for i in range(len(chunks))},
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
+
+        # Persist so the next startup with identical contents loads from
+        # disk instead of re-embedding; drop indexes for folder states
+        # that no longer exist so the cache does not grow without bound
+        if os.path.isdir(cache_root):
+            for entry in os.scandir(cache_root):
+                if entry.is_dir() and entry.path != cache_dir:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+        os.makedirs(cache_root, exist_ok=True)
+        np.savez(
+            cache_path,
+            hashes=np.array(list(cached.keys())),
+            vectors=np.array(list(cached.values()), dtype=np.float32)
+        )
+        vectorstore.save_local(cache_dir)
+        return vectorstore
+    except Exception as e:
+        print(f"Error initializing vector store: {str(e)}")
+        return None
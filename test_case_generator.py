@@ -1,13 +1,18 @@
 import os
 import ollama
 import openai
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import gradio as gr
 
 OLLAMA_API = "http://localhost:11434/api/chat"
-MODEL = "deepseek-r1:7b"
+# Q4_K_M tag: about half the memory bandwidth per decoded token versus
+# the default pull, with negligible quality loss on generated tests
+MODEL = "deepseek-r1:7b-qwen-distill-q4_K_M"
 
 ollama_via_openai = OpenAI(base_url="http://localhost:11434/v1", api_key="ollama")
+# Async client so one slow generation does not block other sessions in
+# the Gradio queue
+ollama_async = AsyncOpenAI(base_url="http://localhost:11434/v1", api_key="ollama")
 
 system_message = (
     "You are a helpful coding assistant for company Code Q&A. "
@@ -35,25 +40,39 @@ def generate_test_cases(code_input):
     except Exception as e:
         return f"Error generating test cases: {str(e)}"
 
-def chat_test_generator(message, history):
+# Running message lists keyed by the full conversation prefix, so
+# concurrent sessions never read each other's state. Reusing the list
+# keeps the prompt prefix byte-identical between turns, letting Ollama
+# reuse its prompt cache; an unknown prefix (new session, cleared or
+# edited history) is rebuilt from Gradio's history
+_session_messages = {}
 
-    messages = [{"role": "system", "content": system_message}]
-    for user_msg, bot_msg in history:
-        messages.append({"role": "user", "content": user_msg})
-        if bot_msg:
-            messages.append({"role": "assistant", "content": bot_msg})
+async def chat_test_generator(message, history):
+
+    key = tuple((user_msg, bot_msg) for user_msg, bot_msg in history)
+    messages = _session_messages.pop(key, None)
+    if messages is None:
+        messages = [{"role": "system", "content": system_message}]
+        for user_msg, bot_msg in history:
+            messages.append({"role": "user", "content": user_msg})
+            if bot_msg:
+                messages.append({"role": "assistant", "content": bot_msg})
     messages.append({"role": "user", "content": message})
 
     response_text = ""
     try:
-        stream = ollama_via_openai.chat.completions.create(
+        stream = await ollama_async.chat.completions.create(
             model=MODEL,
             messages=messages,
             stream=True
         )
-        for chunk in stream:
-            if chunk.choices and chunk.choices[0].delta and "content" in chunk.choices[0].delta:
-                response_text += chunk.choices[0].delta["content"]
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                response_text += chunk.choices[0].delta.content
                 yield response_text
+        messages.append({"role": "assistant", "content": response_text})
+        if len(_session_messages) >= 64:
+            _session_messages.clear()
+        _session_messages[key + ((message, response_text),)] = messages
     except Exception as e:
         yield f"Error: {str(e)}"